@@ -1,6 +1,14 @@
 """pdf_creator package."""
 
-from .app import run  # type: ignore
 from ._version import version as __version__
 
 __all__ = ["run", "__version__"]
+
+
+def __getattr__(name: str):
+    # Render workers import wrentchpdf.utils; only the app itself should pay for gradio.
+    if name == "run":
+        from .app import run
+
+        return run
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
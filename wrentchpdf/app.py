@@ -2,31 +2,40 @@
 
 from __future__ import annotations
 
+import base64
 import contextlib
-from pathlib import Path
+import functools
 import html
-from typing import Any, Dict, Iterable, List, Sequence
+import mmap
+import re
+from pathlib import Path
+from typing import Any, Dict, Generator, Iterable, List, Sequence
 
 import gradio as gr
-from gradio.utils import NamedString
+from gradio.utils import NamedString, get_upload_folder
 
-from wrentchpdf.tempfiles import TempFileTracker, remove_temp_path
+from wrentchpdf.tempfiles import (
+    TempFileTracker,
+    cleanup_expired_paths,
+    remove_temp_path,
+)
 from wrentchpdf.version import version as APP_VERSION
 from wrentchpdf.utils import (
     InvalidImageError,
     PageAsset,
-    assets_to_pdf_bytes,
+    assets_to_pdf_stream,
+    classify,
     image_to_page_asset,
-    is_supported_image,
-    is_supported_pdf,
+    iter_pdf_page_assets,
     persist_pdf,
-    pdf_to_page_assets,
     sanitize_filename,
 )
 
 APP_TITLE = "WrenchPDF - Offline PDF Editor"
 APP_TAGLINE = "Merge, reorder, and compress PDFs locally with complete privacy."
 DEFAULT_COMPRESSION_LEVEL = "Medium"
+# Number of rendered PDF pages between streamed gallery updates.
+PREVIEW_BATCH_SIZE = 8
 COMPRESSION_LEVELS: Dict[str, int | None] = {
     "No compression": None,
     "Medium": 85,
@@ -36,21 +45,36 @@ ASSETS_DIR = Path(__file__).resolve().parent / "assets"
 FAVICON_PATH = ASSETS_DIR / "favicon.png"
 
 
+@functools.lru_cache(maxsize=4)
+def _favicon_uri(mtime_ns: int, size: int) -> str:
+    # The stat signature is the cache key; the arguments only identify the file version.
+    with FAVICON_PATH.open("rb") as handle:
+        if size:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                encoded = base64.b64encode(mapped).decode("ascii")
+        else:
+            encoded = ""
+    mime = "image/png" if FAVICON_PATH.suffix.lower() == ".png" else "image/x-icon"
+    return f"data:{mime};base64,{encoded}"
+
+
 def _load_favicon_data_uri() -> str | None:
-    if not FAVICON_PATH.exists():
-        return None
     try:
-        import base64
-
-        encoded = base64.b64encode(FAVICON_PATH.read_bytes()).decode("ascii")
-        mime = "image/png" if FAVICON_PATH.suffix.lower() == ".png" else "image/x-icon"
-        return f"data:{mime};base64,{encoded}"
-    except OSError:
+        stat = FAVICON_PATH.stat()
+        return _favicon_uri(stat.st_mtime_ns, stat.st_size)
+    except (OSError, ValueError):
         return None
 
 
+def _minify_css(css: str) -> str:
+    """Drop the whitespace Gradio would otherwise ship in every config payload."""
+    css = re.sub(r"\s*([{};,])\s*", r"\1", css.strip())
+    return re.sub(r":\s+", ":", re.sub(r"\s+", " ", css))
+
+
 FAVICON_DATA_URI = _load_favicon_data_uri()
-CSS = """
+CSS = _minify_css(
+    """
 #page-gallery .gallery img { width: 120px !important; height: auto; }
 #page-gallery .grid-container { gap: 0.25rem !important; }
 #page-gallery button[aria-label="preview"] { cursor: zoom-in; }
@@ -91,9 +115,12 @@ CSS = """
     color: #ffffff !important;
 }
 """
+)
 
 
 def _ensure_sequence(files: Any) -> Sequence[Any]:
+    if type(files) is list:  # the Gradio payload; skip the isinstance ladder
+        return files
     if files is None:
         return []
     if isinstance(files, (str, Path)):
@@ -103,20 +130,43 @@ def _ensure_sequence(files: Any) -> Sequence[Any]:
     return [files]
 
 
-def _extract_path_and_name(uploaded: Any) -> tuple[Path | None, str | None]:
+def _path_and_name_from_path(uploaded: Path) -> tuple[str | None, str | None]:
+    return str(uploaded), uploaded.name
+
+
+def _path_and_name_from_dict(uploaded: dict) -> tuple[str | None, str | None]:
+    # Gradio FileData payload
+    path_str = uploaded.get("path")
+    if not path_str:
+        return None, None
+    return path_str, uploaded.get("orig_name")
+
+
+def _path_and_name_from_str(uploaded: str) -> tuple[str | None, str | None]:
+    return uploaded, getattr(uploaded, "name", None)
+
+
+# Exact-type fast paths; subclasses fall through to the isinstance checks below.
+_EXTRACT_DISPATCH = {
+    dict: _path_and_name_from_dict,
+    str: _path_and_name_from_str,
+    NamedString: _path_and_name_from_str,
+    type(Path()): _path_and_name_from_path,
+}
+
+
+def _extract_path_and_name(uploaded: Any) -> tuple[str | None, str | None]:
+    handler = _EXTRACT_DISPATCH.get(type(uploaded))
+    if handler is not None:
+        return handler(uploaded)
     if uploaded is None:
         return None, None
     if isinstance(uploaded, Path):
-        return uploaded, uploaded.name
-    if isinstance(uploaded, dict):  # Gradio FileData payload
-        path_str = uploaded.get("path")
-        if not path_str:
-            return None, None
-        display = uploaded.get("orig_name") or Path(path_str).name
-        return Path(path_str), display
+        return _path_and_name_from_path(uploaded)
+    if isinstance(uploaded, dict):
+        return _path_and_name_from_dict(uploaded)
     if isinstance(uploaded, str):
-        name_attr = getattr(uploaded, "name", None)
-        return Path(uploaded), name_attr or Path(uploaded).name
+        return _path_and_name_from_str(uploaded)
     path_str = getattr(uploaded, "name", None) or getattr(uploaded, "path", None)
     if path_str is None:
         return None, None
@@ -125,21 +175,23 @@ def _extract_path_and_name(uploaded: Any) -> tuple[Path | None, str | None]:
         or getattr(uploaded, "label", None)
         or getattr(uploaded, "name", None)
     )
-    return Path(path_str), display
+    return str(path_str), display
 
 
 def _asset_to_named_string(asset: PageAsset) -> NamedString:
-    file_ref = NamedString(str(asset.preview_path))
-    file_ref.name = asset.display_name
+    file_ref = asset.file_ref
+    if file_ref is None:
+        file_ref = NamedString(asset.preview_path_str)
+        file_ref.name = asset.display_name
+        asset.file_ref = file_ref
     return file_ref
 
 
 def _build_gallery_payload(assets: Sequence[PageAsset]) -> List[tuple]:
-    items: List[tuple] = []
-    for index, asset in enumerate(assets, start=1):
-        caption = f"{index}. {asset.display_name}"
-        items.append((str(asset.preview_path), caption))
-    return items
+    return [
+        (asset.preview_path_str, "%d. %s" % (index, asset.display_name))
+        for index, asset in enumerate(assets, start=1)
+    ]
 
 
 def _cleanup_temp(
@@ -153,22 +205,40 @@ def _cleanup_temp(
         remove_temp_path(path)
 
 
-def _cleanup_assets(
-    assets: Iterable[PageAsset],
-    *,
-    temp_tracker: TempFileTracker | None = None,
-) -> None:
+def _cleanup_assets(assets: Iterable[PageAsset]) -> None:
+    # Previews are not registered one by one; their per-document directory is, and
+    # goes with the session's tracker.
     for asset in assets:
         if asset.temp_preview:
-            if temp_tracker is not None:
-                temp_tracker.discard(asset.preview_path, remove=True)
-            else:
-                remove_temp_path(asset.preview_path)
+            asset.preview_path.unlink(missing_ok=True)
+
+
+def _gradio_cache_dir() -> Path:
+    # Files already inside Gradio's cache are served in place; anywhere else Gradio
+    # hashes the whole file and keeps its own copy under a new path, which our
+    # cleanup never removes and which no longer matches the session's assets.
+    directory = Path(get_upload_folder()) / "wrentchpdf"
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def _reset_create_button() -> Dict[str, Any]:
+    # A fresh dict every time: Gradio pops "value" out of update dicts while
+    # applying them, so a shared module-level update would be emptied after one use.
+    return gr.update(
+        value=None,
+        label="Create PDF",
+        variant="primary",
+        elem_classes=[],
+        interactive=True,
+    )
+
+
+_STATUS_TEMPLATES = ("⚠️ %s", "✅ %s")  # indexed by ``success``
 
 
 def _format_status(message: str, success: bool = True) -> str:
-    icon = "✅" if success else "⚠️"
-    return f"{icon} {message}"
+    return _STATUS_TEMPLATES[bool(success)] % message
 
 
 def _resolve_compression(level: str | None) -> tuple[bool, int]:
@@ -178,125 +248,207 @@ def _resolve_compression(level: str | None) -> tuple[bool, int]:
     return True, value
 
 
+_Reconciliation = Generator[
+    List[PageAsset], None, tuple[List[PageAsset], List[NamedString], List[PageAsset]]
+]
+
+
+def _add_upload(
+    uploaded: Any,
+    ordered_assets: List[PageAsset],
+    component_files: List[NamedString],
+    *,
+    temp_tracker: TempFileTracker | None,
+) -> Generator[List[PageAsset], None, None]:
+    """Append the pages of one new upload, yielding progress while a PDF renders."""
+    path_str, display_name = _extract_path_and_name(uploaded)
+    if path_str is None:
+        return
+    path = Path(path_str)
+    kind = classify(path)
+    if kind == "image":
+        asset = image_to_page_asset(path, display_name=display_name, kind=kind)
+        ordered_assets.append(asset)
+        component_files.append(_asset_to_named_string(asset))
+    elif kind == "pdf":
+        pages = iter_pdf_page_assets(
+            path, temp_tracker=temp_tracker, preview_dir=_gradio_cache_dir(), kind=kind
+        )
+        for rendered, page in enumerate(pages, start=1):
+            ordered_assets.append(page)
+            component_files.append(_asset_to_named_string(page))
+            if rendered % PREVIEW_BATCH_SIZE == 0:
+                yield ordered_assets
+    else:
+        raise InvalidImageError(
+            f"Unsupported file '{path.name}'. Please add images or PDF documents."
+        )
+
+
 def _reconcile_assets(
-    files: Any,
+    new_files: Any,
+    keep_assets: Sequence[PageAsset] | None,
+    *,
+    temp_tracker: TempFileTracker | None = None,
+) -> _Reconciliation:
+    """Append new uploads after the already-resolved ``keep_assets``.
+
+    Yields the pages gathered so far while PDFs render and returns
+    ``(assets, component_files, removed_assets)``.
+    """
+    ordered_assets = list(keep_assets or [])
+    component_files = [_asset_to_named_string(asset) for asset in ordered_assets]
+    for uploaded in _ensure_sequence(new_files):
+        yield from _add_upload(
+            uploaded, ordered_assets, component_files, temp_tracker=temp_tracker
+        )
+    return ordered_assets, component_files, []
+
+
+def _reorder_assets(
+    ordered_tokens: Any,
     current_assets: Sequence[PageAsset] | None,
     *,
     temp_tracker: TempFileTracker | None = None,
-) -> tuple[List[PageAsset], List[NamedString], List[PageAsset]]:
-    existing_assets = list(current_assets or [])
+) -> _Reconciliation:
+    """Apply the client's page order; unknown tokens are files dropped onto the list."""
     current_map: Dict[str, PageAsset] = {
-        str(asset.preview_path): asset for asset in existing_assets
+        asset.preview_path_str: asset for asset in (current_assets or [])
     }
     ordered_assets: List[PageAsset] = []
     component_files: List[NamedString] = []
 
-    for uploaded in _ensure_sequence(files):
-        path, display_name = _extract_path_and_name(uploaded)
-        if path is None:
-            continue
-        key = str(path)
-        if key in current_map:
-            asset = current_map.pop(key)
+    for uploaded in _ensure_sequence(ordered_tokens):
+        path_str, _ = _extract_path_and_name(uploaded)
+        asset = current_map.pop(path_str, None) if path_str is not None else None
+        if asset is not None:
             ordered_assets.append(asset)
             component_files.append(_asset_to_named_string(asset))
             continue
-
-        if is_supported_image(path):
-            asset = image_to_page_asset(path, display_name=display_name)
-            ordered_assets.append(asset)
-            component_files.append(_asset_to_named_string(asset))
-        elif is_supported_pdf(path):
-            new_pages = pdf_to_page_assets(path, temp_tracker=temp_tracker)
-            ordered_assets.extend(new_pages)
-            component_files.extend(_asset_to_named_string(page) for page in new_pages)
-        else:
-            raise InvalidImageError(
-                f"Unsupported file '{path.name}'. Please add images or PDF documents."
-            )
+        yield from _add_upload(
+            uploaded, ordered_assets, component_files, temp_tracker=temp_tracker
+        )
 
     removed_assets = list(current_map.values())
     return ordered_assets, component_files, removed_assets
 
 
-def _handle_files(
-    files: Any,
-    current_assets: Sequence[PageAsset] | None = None,
-    current_pdf: str | None = None,
-    temp_tracker: TempFileTracker | None = None,
-):
-    if temp_tracker is None:
-        temp_tracker = TempFileTracker()
+def _matches_current_order(files: Any, assets: Sequence[PageAsset]) -> bool:
+    uploaded = _ensure_sequence(files)
+    if len(uploaded) != len(assets):
+        return False
+    return all(
+        _extract_path_and_name(item)[0] == asset.preview_path_str
+        for item, asset in zip(uploaded, assets)
+    )
+
 
+def _stream_page_updates(
+    reconcile: _Reconciliation,
+    current_assets: Sequence[PageAsset] | None,
+    current_pdf: str | None,
+    temp_tracker: TempFileTracker,
+):
     if current_pdf:
         _cleanup_temp(current_pdf, temp_tracker=temp_tracker)
 
     try:
-        assets, component_files, removed = _reconcile_assets(
-            files, current_assets, temp_tracker=temp_tracker
+        while True:
+            try:
+                partial = next(reconcile)
+            except StopIteration as finished:
+                assets, component_files, removed = finished.value
+                break
+            yield (
+                gr.update(),
+                list(current_assets or []),
+                gr.update(value=_build_gallery_payload(partial), visible=True),
+                gr.update(interactive=False),
+                _format_status(f"Rendering pages… {len(partial)} loaded so far."),
+                None,
+                temp_tracker,
+            )
+    except Exception as exc:  # any render failure must still restore the prior pages
+        message = (
+            str(exc)
+            if isinstance(exc, InvalidImageError)
+            else "Unable to load the uploaded files. Please try again."
         )
-    except InvalidImageError as exc:
         existing_assets = list(current_assets or [])
         gallery_payload = _build_gallery_payload(existing_assets)
-        return (
+        yield (
             gr.update(
                 value=[_asset_to_named_string(asset) for asset in existing_assets] or None
             ),
             existing_assets,
             gr.update(value=gallery_payload or None, visible=bool(gallery_payload)),
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
-            _format_status(str(exc), success=False),
+            _reset_create_button(),
+            _format_status(message, success=False),
             current_pdf,
             temp_tracker,
         )
+        return
 
-    _cleanup_assets(removed, temp_tracker=temp_tracker)
+    _cleanup_assets(removed)
 
     if not assets:
-        return (
+        yield (
             gr.update(value=None, visible=False),
             [],
             gr.update(value=None, visible=False),
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
+            _reset_create_button(),
             _format_status("Upload images or PDFs to get started."),
             None,
             temp_tracker,
         )
+        return
 
     gallery_payload = _build_gallery_payload(assets)
     pages_count = len(assets)
     status = _format_status(
         f"Loaded {pages_count} page{'s' if pages_count != 1 else ''}. Drag rows on the left to reorder, click thumbnails to preview."
     )
-    return (
+    yield (
         gr.update(value=component_files or None, visible=True),
         assets,
         gr.update(value=gallery_payload, visible=True),
-        gr.update(
-            value=None,
-            label="Create PDF",
-            variant="primary",
-            elem_classes=[],
-            interactive=True,
-        ),
+        _reset_create_button(),
         status,
         None,
         temp_tracker,
     )
 
 
+def _handle_files(
+    files: Any,
+    current_assets: Sequence[PageAsset] | None = None,
+    current_pdf: str | None = None,
+    temp_tracker: TempFileTracker | None = None,
+):
+    if temp_tracker is None:
+        temp_tracker = TempFileTracker()
+
+    if current_assets and _matches_current_order(files, current_assets):
+        # Echo of our own update (or a drop that changed nothing): skip all work.
+        yield (
+            gr.update(),
+            list(current_assets),
+            gr.update(),
+            gr.update(),
+            gr.update(),
+            current_pdf,
+            temp_tracker,
+        )
+        return
+
+    yield from _stream_page_updates(
+        _reorder_assets(files, current_assets, temp_tracker=temp_tracker),
+        current_assets,
+        current_pdf,
+        temp_tracker,
+    )
+
+
 def _handle_upload(
     files: Any,
     current_assets: Sequence[PageAsset] | None = None,
@@ -304,53 +456,28 @@ def _handle_upload(
     temp_tracker: TempFileTracker | None = None,
 ):
     if not files:
-        return (
+        yield (
             gr.update(value=None),
             gr.update(),
             current_assets or [],
             gr.update(),
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
+            _reset_create_button(),
             gr.update(),
             current_pdf,
             temp_tracker or TempFileTracker(),
         )
+        return
 
-    existing_tokens = [
-        _asset_to_named_string(asset) for asset in (current_assets or [])
-    ]
-    combined_inputs = existing_tokens + list(_ensure_sequence(files))
+    if temp_tracker is None:
+        temp_tracker = TempFileTracker()
 
-    (
-        pages_update,
-        assets,
-        gallery_update,
-        download_update,
-        status,
-        pdf_token,
+    for outputs in _stream_page_updates(
+        _reconcile_assets(files, current_assets, temp_tracker=temp_tracker),
+        current_assets,
+        current_pdf,
         temp_tracker,
-    ) = _handle_files(
-        combined_inputs,
-        current_assets=current_assets,
-        current_pdf=current_pdf,
-        temp_tracker=temp_tracker,
-    )
-
-    return (
-        gr.update(value=None),
-        pages_update,
-        assets,
-        gallery_update,
-        download_update,
-        status,
-        pdf_token,
-        temp_tracker,
-    )
+    ):
+        yield (gr.update(value=None), *outputs)
 
 
 def _handle_convert(
@@ -369,26 +496,14 @@ def _handle_convert(
                 f"Ready to create another PDF after downloading '{path.name}'."
             )
             return (
-                gr.update(
-                    value=None,
-                    label="Create PDF",
-                    variant="primary",
-                    elem_classes=[],
-                    interactive=True,
-                ),
-            message,
-            None,
-            tracker,
-        )
+                _reset_create_button(),
+                message,
+                None,
+                tracker,
+            )
         # previous path missing, reset gracefully
         return (
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
+            _reset_create_button(),
             _format_status("Previous PDF no longer available. Generate a new one."),
             None,
             tracker,
@@ -396,13 +511,7 @@ def _handle_convert(
 
     if not assets:
         return (
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
+            _reset_create_button(),
             _format_status("Add at least one page before converting.", success=False),
             previous_pdf,
             tracker,
@@ -410,23 +519,25 @@ def _handle_convert(
     target_name = sanitize_filename(desired_name or "output.pdf")
     try:
         compress, quality = _resolve_compression(compression_level)
-        pdf_bytes = assets_to_pdf_bytes(
-            assets, compress=compress, compression_quality=quality
+        pdf_path = persist_pdf(
+            functools.partial(
+                assets_to_pdf_stream,
+                assets,
+                compress=compress,
+                compression_quality=quality,
+                optimize_final=True,  # the download is final; spend the time on smaller JPEGs
+            ),
+            filename=target_name,
+            temp_tracker=tracker,
+            directory=_gradio_cache_dir(),
         )
     except InvalidImageError as exc:
         return (
-            gr.update(
-                value=None,
-                label="Create PDF",
-                variant="primary",
-                elem_classes=[],
-                interactive=True,
-            ),
+            _reset_create_button(),
             _format_status(str(exc), success=False),
             previous_pdf,
             tracker,
         )
-    pdf_path = persist_pdf(pdf_bytes, filename=target_name, temp_tracker=tracker)
     if previous_pdf and previous_pdf != str(pdf_path):
         _cleanup_temp(previous_pdf, temp_tracker=tracker)
     message = _format_status(
@@ -455,7 +566,7 @@ def _handle_clear(
     assets_list = list(current_assets) if current_assets else []
     assets_removed = len(assets_list)
     pdf_removed = 1 if current_pdf else 0
-    _cleanup_assets(assets_list, temp_tracker=tracker)
+    _cleanup_assets(assets_list)
     _cleanup_temp(current_pdf, temp_tracker=tracker)
     tracker.cleanup()
     removed_parts: list[str] = []
@@ -476,13 +587,7 @@ def _handle_clear(
         gr.update(value=None, visible=False),
         [],
         gr.update(value=None, visible=False),
-        gr.update(
-            value=None,
-            label="Create PDF",
-            variant="primary",
-            elem_classes=[],
-            interactive=True,
-        ),
+        _reset_create_button(),
         status_update,
         None,
         gr.update(value=DEFAULT_COMPRESSION_LEVEL, interactive=True),
@@ -576,6 +681,7 @@ def build_interface() -> gr.Blocks:
 
         pages_input.change(
             fn=_handle_files,
+            trigger_mode="always_last",
             inputs=[pages_input, pages_state, pdf_state, temp_tracker_state],
             outputs=[
                 pages_input,
@@ -636,6 +742,7 @@ def build_interface() -> gr.Blocks:
 
 def run(**launch_kwargs):
     """Launch the Gradio interface."""
+    cleanup_expired_paths()  # also loads the registry; importers such as render workers skip it
     app = build_interface()
     if FAVICON_PATH.exists():
         launch_kwargs.setdefault("favicon_path", str(FAVICON_PATH))
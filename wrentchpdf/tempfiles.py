@@ -4,12 +4,20 @@ from __future__ import annotations
 
 import contextlib
 import json
+import os
+import shutil
 import tempfile
 import threading
+from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Set
+from typing import Dict, Iterable, Iterator, Set, TextIO
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: no inter-process locking
+    fcntl = None  # type: ignore[assignment]
 
 __all__ = [
     "DEFAULT_TTL",
@@ -17,12 +25,22 @@ __all__ = [
     "cleanup_expired_paths",
     "register_temp_path",
     "remove_temp_path",
+    "remove_temp_paths",
     "unregister_temp_path",
+    "unregister_temp_paths",
 ]
 
 DEFAULT_TTL = timedelta(days=1)
 _REGISTRY_PATH = Path(tempfile.gettempdir()) / "wrentchpdf-temp-files.json"
+_WAL_PATH = _REGISTRY_PATH.with_suffix(".log")
 _REGISTRY_LOCK = threading.RLock()
+# Compact once the log holds this many records per live entry (never below the floor).
+_WAL_COMPACT_FACTOR = 4
+_WAL_COMPACT_MIN_RECORDS = 64
+
+_REGISTRY: Dict[str, float] = {}
+_wal_handle: TextIO | None = None
+_wal_records = 0
 
 
 def _read_registry() -> Dict[str, float]:
@@ -41,84 +59,219 @@ def _read_registry() -> Dict[str, float]:
     }
 
 
-def _write_registry(entries: Dict[str, float]) -> None:
+def _write_registry(entries: Dict[str, float]) -> bool:
+    # Write a sibling file and swap it in so readers never see a truncated snapshot.
+    tmp_path = _REGISTRY_PATH.with_suffix(f".json.{os.getpid()}.tmp")
     try:
-        _REGISTRY_PATH.write_text(json.dumps(entries))
+        tmp_path.write_bytes(json.dumps(entries, separators=(",", ":")).encode("utf-8"))
+        os.replace(tmp_path, _REGISTRY_PATH)
     except OSError:  # pragma: no cover - best effort persistence
+        with contextlib.suppress(OSError):
+            tmp_path.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _replay_wal(entries: Dict[str, float]) -> int:
+    """Apply logged operations on top of ``entries`` and return the record count."""
+    if not _WAL_PATH.exists():
+        return 0
+    records = 0
+    try:
+        with _WAL_PATH.open(encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:  # pragma: no cover - torn trailing write
+                    continue
+                if not isinstance(record, dict) or not isinstance(record.get("path"), str):
+                    continue
+                path_str = str(Path(record["path"]))
+                expires_at = record.get("exp")
+                if record.get("op") == "add" and isinstance(expires_at, (int, float)):
+                    entries[path_str] = float(expires_at)
+                elif record.get("op") == "remove":
+                    entries.pop(path_str, None)
+                records += 1
+    except OSError:  # pragma: no cover - defensive IO guard
         pass
+    return records
+
+
+@contextlib.contextmanager
+def _locked_wal() -> Iterator[TextIO | None]:
+    """Yield the shared log handle under an exclusive inter-process ``flock``.
+
+    Callers hold ``_REGISTRY_LOCK`` too: ``flock`` does not exclude threads sharing the handle.
+    The log is never unlinked, so every process locks and appends to the same file.
+    """
+    global _wal_handle
+    try:
+        if _wal_handle is None:
+            _wal_handle = _WAL_PATH.open("a", encoding="utf-8")
+        if fcntl is not None:
+            fcntl.flock(_wal_handle.fileno(), fcntl.LOCK_EX)
+    except OSError:  # pragma: no cover - best effort persistence
+        yield None
+        return
+    try:
+        yield _wal_handle
+    finally:
+        if fcntl is not None:
+            with contextlib.suppress(OSError):
+                fcntl.flock(_wal_handle.fileno(), fcntl.LOCK_UN)
+
+
+def _load_from_disk(entries: Dict[str, float]) -> int:
+    """Replace ``entries`` with the snapshot plus log; caller holds the log lock."""
+    entries.clear()
+    entries.update(_read_registry())
+    return _replay_wal(entries)
+
+
+def _compact_registry(handle: TextIO) -> None:
+    """Merge every process's records, prune, rewrite the snapshot and empty the log."""
+    global _wal_records
+    _load_from_disk(_REGISTRY)
+    _prune_expired(datetime.now(timezone.utc).timestamp())
+    if not _write_registry(_REGISTRY):  # pragma: no cover - keep the log if the snapshot failed
+        return
+    with contextlib.suppress(OSError):
+        handle.truncate(0)
+    _wal_records = 0
+
+
+def _append_wal(*records: Dict[str, object]) -> None:
+    global _wal_records
+    with _locked_wal() as handle:
+        if handle is None:  # pragma: no cover - best effort persistence
+            return
+        try:
+            handle.write("".join(json.dumps(record) + "\n" for record in records))
+            handle.flush()
+        except OSError:  # pragma: no cover - best effort persistence
+            return
+        _wal_records += len(records)
+        if _wal_records > _WAL_COMPACT_FACTOR * max(len(_REGISTRY), _WAL_COMPACT_MIN_RECORDS):
+            _compact_registry(handle)
 
 
 def _cleanup_entry(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+        return
     with contextlib.suppress(OSError):
         path.unlink(missing_ok=True)
 
 
+def _existing_names_by_dir(path_strs: Iterable[str]) -> Dict[str, Set[str] | None]:
+    """List each parent directory once; None marks a directory that could not be read."""
+    by_dir: Dict[str, Set[str]] = defaultdict(set)
+    for path_str in path_strs:
+        directory, name = os.path.split(path_str)
+        by_dir[directory].add(name)
+    existing: Dict[str, Set[str] | None] = {}
+    for directory, names in by_dir.items():
+        try:
+            with os.scandir(directory or ".") as entries:
+                existing[directory] = {entry.name for entry in entries if entry.name in names}
+        except FileNotFoundError:
+            existing[directory] = set()
+        except OSError:  # pragma: no cover - fall back to per-entry checks
+            existing[directory] = None
+    return existing
+
+
+def _prune_expired(timestamp: float) -> bool:
+    existing = _existing_names_by_dir(_REGISTRY)
+    changed = False
+    for path_str, expires_at in list(_REGISTRY.items()):
+        directory, name = os.path.split(path_str)
+        names = existing[directory]
+        present = name in names if names is not None else os.path.exists(path_str)
+        if expires_at <= timestamp or not present:
+            _cleanup_entry(Path(path_str))
+            del _REGISTRY[path_str]
+            changed = True
+    return changed
+
+
 def cleanup_expired_paths(now: datetime | None = None) -> None:
     """Remove registry entries whose expiry has passed or files are gone."""
+    global _wal_records
     timestamp = (now or datetime.now(timezone.utc)).timestamp()
-    with _REGISTRY_LOCK:
-        registry = _read_registry()
-        updated: Dict[str, float] = {}
-        for path_str, expires_at in registry.items():
-            path = Path(path_str)
-            if expires_at <= timestamp or not path.exists():
-                _cleanup_entry(path)
-                continue
-            updated[path_str] = expires_at
-        if updated != registry:
-            _write_registry(updated)
+    with _REGISTRY_LOCK, _locked_wal() as handle:
+        if handle is None:  # pragma: no cover - registry unavailable; prune what we know
+            _prune_expired(timestamp)
+            return
+        _wal_records = _load_from_disk(_REGISTRY)
+        if _prune_expired(timestamp) and _write_registry(_REGISTRY):
+            with contextlib.suppress(OSError):
+                handle.truncate(0)
+            _wal_records = 0
 
 
 def register_temp_path(path: str | Path, *, ttl: timedelta | None = None) -> None:
-    """Record a path in the registry and prune expired entries."""
-    path_obj = Path(path)
+    """Record a path in the registry; expired entries are pruned on compaction."""
+    path_str = str(Path(path))
     ttl = ttl or DEFAULT_TTL
-    expires_at = datetime.now(timezone.utc) + ttl
+    expires_at = (datetime.now(timezone.utc) + ttl).timestamp()
     with _REGISTRY_LOCK:
-        registry = _read_registry()
-        now_ts = datetime.now(timezone.utc).timestamp()
-        changed = False
-        for path_str, expiry in list(registry.items()):
-            candidate = Path(path_str)
-            if expiry <= now_ts or not candidate.exists():
-                _cleanup_entry(candidate)
-                del registry[path_str]
-                changed = True
-        registry[str(path_obj)] = expires_at.timestamp()
-        changed = True
-        if changed:
-            _write_registry(registry)
+        _REGISTRY[path_str] = expires_at
+        _append_wal({"op": "add", "path": path_str, "exp": expires_at})
 
 
 def unregister_temp_path(path: str | Path) -> None:
     path_str = str(Path(path))
     with _REGISTRY_LOCK:
-        registry = _read_registry()
-        if path_str in registry:
-            del registry[path_str]
-            _write_registry(registry)
+        if _REGISTRY.pop(path_str, None) is not None:
+            _append_wal({"op": "remove", "path": path_str})
 
 
 def remove_temp_path(path: str | Path) -> None:
-    """Delete a temp file and unregister it from the registry."""
+    """Delete a temp file (or directory) and unregister it from the registry."""
     path_obj = Path(path)
     _cleanup_entry(path_obj)
     unregister_temp_path(path_obj)
 
 
+def unregister_temp_paths(paths: Iterable[str | Path]) -> None:
+    """Drop several paths from the registry in a single update."""
+    path_strs = [str(Path(path)) for path in paths]
+    with _REGISTRY_LOCK:
+        removed = [
+            path_str for path_str in path_strs if _REGISTRY.pop(path_str, None) is not None
+        ]
+        if removed:
+            _append_wal(*({"op": "remove", "path": path_str} for path_str in removed))
+
+
+def remove_temp_paths(paths: Iterable[str | Path]) -> None:
+    """Delete several temp files and unregister them in a single registry update."""
+    path_objs = [Path(path) for path in paths]
+    for path_obj in path_objs:
+        _cleanup_entry(path_obj)
+    unregister_temp_paths(path_objs)
+
+
 @dataclass
 class TempFileTracker:
     """Session-scoped helper that tracks temp artifacts for eager cleanup."""
 
     ttl: timedelta = DEFAULT_TTL
     _paths: Set[Path] = field(default_factory=set)
-    _lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    # ``add``/``discard``/``discard_many`` skip the lock. Each makes one set call, and
+    # ``Path`` hashing and equality are Python code, so threads can interleave inside it.
+    # The set stays consistent and concurrent updates to different paths are not lost,
+    # which is all these need. ``cleanup`` takes the lock because it snapshots the set
+    # and then bulk-removes entries.
 
-    def add(self, path: str | Path) -> None:
+    def add(self, path: str | Path, *, ttl: timedelta | None = None) -> None:
         path_obj = Path(path)
-        register_temp_path(path_obj, ttl=self.ttl)
-        with self._lock:
-            self._paths.add(path_obj)
+        register_temp_path(path_obj, ttl=ttl or self.ttl)
+        self._paths.add(path_obj)
 
     def discard(self, path: str | Path, *, remove: bool = False) -> None:
         path_obj = Path(path)
@@ -126,18 +279,22 @@ class TempFileTracker:
             remove_temp_path(path_obj)
         else:
             unregister_temp_path(path_obj)
-        with self._lock:
-            self._paths.discard(path_obj)
+        self._paths.discard(path_obj)
+
+    def discard_many(self, paths: Iterable[str | Path], *, remove: bool = False) -> None:
+        path_objs = [Path(path) for path in paths]
+        if remove:
+            remove_temp_paths(path_objs)
+        else:
+            unregister_temp_paths(path_objs)
+        self._paths.difference_update(path_objs)
 
     def cleanup(self) -> None:
         with self._lock:
-            for path in list(self._paths):
-                remove_temp_path(path)
-            self._paths.clear()
+            paths = list(self._paths)
+            self._paths.difference_update(paths)
+            remove_temp_paths(paths)
 
     def __del__(self) -> None:  # pragma: no cover - best effort GC hook
         with contextlib.suppress(Exception):
             self.cleanup()
-
-
-cleanup_expired_paths()
@@ -2,20 +2,34 @@
 
 from __future__ import annotations
 
+import atexit
+import functools
+import hashlib
 import io
+import itertools
+import mmap
+import multiprocessing
+import os
 import re
+import shutil
 import tempfile
+import threading
+import time
 import contextlib
-from dataclasses import dataclass
+import ctypes
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import timedelta
 from pathlib import Path
-from typing import Iterable, List, Sequence, TYPE_CHECKING
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Sequence, TYPE_CHECKING
 from uuid import uuid4
 
 import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
 from PIL import Image
-from pypdf import PdfReader, PdfWriter
 
-from wrentchpdf.tempfiles import register_temp_path
+from wrentchpdf.tempfiles import register_temp_path, remove_temp_path, remove_temp_paths
 
 if TYPE_CHECKING:  # pragma: no cover - imported for type hints only
     from wrentchpdf.tempfiles import TempFileTracker
@@ -31,7 +45,50 @@ SUPPORTED_IMAGE_EXTENSIONS = {
 }
 
 SUPPORTED_PDF_EXTENSIONS = {".pdf"}
+_KIND_BY_EXT: dict[str, str] = dict.fromkeys(SUPPORTED_IMAGE_EXTENSIONS, "image") | dict.fromkeys(
+    SUPPORTED_PDF_EXTENSIONS, "pdf"
+)
+# Modes the JPEG encoder and a /DCTDecode image XObject take without conversion.
+_JPEG_DIRECT_MODES = frozenset({"RGB", "L"})
+_FILENAME_SANITIZE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
 PDF_PREVIEW_SCALE = 2.0
+# Cap on preview width so oversized pages (posters, drawings) stay thumbnail-sized.
+PDF_PREVIEW_MAX_WIDTH = 1600
+# Previews are throwaway thumbnails: baseline JPEG encodes far faster and smaller than PNG.
+PREVIEW_SUFFIX = ".jpg"
+PREVIEW_JPEG_QUALITY = 85
+# Rendered previews are shared across sessions by content hash for a short while;
+# a session drops the entries it rendered or reused when it is cleared.
+PREVIEW_CACHE_ROOT = Path(tempfile.gettempdir()) / "wrentchpdf-preview-cache"
+PREVIEW_CACHE_TTL = timedelta(hours=1)
+PREVIEW_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Written last into each entry: its page count, so a partly removed entry reads as a miss.
+_PREVIEW_CACHE_MANIFEST = "pages"
+
+
+def _available_cpus() -> int:
+    """CPUs this process may run on, capped by a cgroup v2 CPU quota if one is set."""
+    count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+    # A CFS quota throttles the container without changing its affinity mask.
+    with contextlib.suppress(OSError, ValueError):
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            count = min(count, max(1, int(quota) // int(period)))
+    return count
+
+
+PDF_RENDER_WORKERS = _available_cpus()
+# Pages per pool job: small enough to stream early pages, large enough to amortize opens.
+PDF_RENDER_CHUNK_PAGES = 4
+
+_RENDER_POOL: ProcessPoolExecutor | None = None
+_RENDER_POOL_LOCK = threading.Lock()
+# pdfium is not thread-safe; every call in this process goes through this lock.
+# Never hold it across a yield: a streaming generator may resume on another thread.
+_PDFIUM_LOCK = threading.RLock()
+# Asset ids only need to be unique within this process; avoid a urandom read per page.
+_ID_PREFIX = uuid4().hex[:8]
+_id_counter = itertools.count()
 
 
 @dataclass(slots=True)
@@ -45,15 +102,26 @@ class PageAsset:
     preview_path: Path
     page_index: int = 0
     temp_preview: bool = False
+    preview_path_str: str = field(init=False, repr=False, compare=False)
+    # UI file token for this page, built lazily by the app and reused across events.
+    file_ref: Any = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        # Cached so UI lookups keyed by the preview path never re-stringify it.
+        self.preview_path_str = str(self.preview_path)
 
 
 class InvalidImageError(Exception):
     """Raised when an uploaded file cannot be processed as an image."""
 
 
+def _next_id() -> str:
+    return f"{_ID_PREFIX}-{next(_id_counter):x}"
+
+
 def sanitize_filename(raw: str, default: str = "output.pdf") -> str:
     """Return a safe filename with `.pdf` suffix ensured."""
-    cleaned = re.sub(r"[^A-Za-z0-9_.-]+", "_", raw).strip("._")
+    cleaned = _FILENAME_SANITIZE_RE.sub("_", raw).strip("._")
     if not cleaned:
         cleaned = Path(default).stem
     if not cleaned.lower().endswith(".pdf"):
@@ -61,49 +129,72 @@ def sanitize_filename(raw: str, default: str = "output.pdf") -> str:
     return cleaned
 
 
+def classify(path: Path) -> str | None:
+    """Return the asset kind for ``path`` by extension: "image", "pdf", or None."""
+    return _KIND_BY_EXT.get(path.suffix.lower())
+
+
 def is_supported_image(path: Path) -> bool:
-    return path.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS
+    return classify(path) == "image"
 
 
 def is_supported_pdf(path: Path) -> bool:
-    return path.suffix.lower() in SUPPORTED_PDF_EXTENSIONS
+    return classify(path) == "pdf"
 
 
-def _compress_image(image: Image.Image, quality: int = 80) -> Image.Image:
-    buffer = io.BytesIO()
+@contextlib.contextmanager
+def _jpeg_source(img: Image.Image) -> Iterator[Image.Image]:
+    """Yield ``img`` in a mode the JPEG encoder takes as-is; RGB and L skip the copy."""
+    source = img if img.mode in _JPEG_DIRECT_MODES else img.convert("RGB")
     try:
-        image.save(buffer, format="JPEG", optimize=True, quality=quality)
-        buffer.seek(0)
-        compressed = Image.open(buffer)
-        compressed.load()
-        result = compressed.convert("RGB")
-        compressed.close()
-        return result
+        yield source
     finally:
-        buffer.close()
+        if source is not img:
+            source.close()
+
+
+def _compress_image(image: Image.Image, quality: int = 80, *, optimize: bool = False) -> Image.Image:
+    """Round-trip ``image`` through JPEG.
+
+    ``optimize`` adds a Huffman-table pass: a few percent smaller, roughly twice the encode time.
+    """
+    with io.BytesIO() as buffer:
+        image.save(buffer, format="JPEG", optimize=optimize, quality=quality)
+        buffer.seek(0)
+        with Image.open(buffer) as compressed:
+            compressed.load()
+            return compressed.convert("RGB")
+
+
+def _prepare_rgb_image(
+    img: Image.Image, *, compress: bool, quality: int, optimize: bool = False
+) -> Image.Image:
+    """Return an RGB copy of ``img``, JPEG round-tripped when ``compress`` is set."""
+    if not compress:
+        return img.convert("RGB") if img.mode != "RGB" else img.copy()
+    with _jpeg_source(img) as source:
+        return _compress_image(source, quality=quality, optimize=optimize)
 
 
 def load_image_for_pdf(path: Path, *, compress: bool = True, quality: int = 80) -> Image.Image:
     """Load an image suitable for PDF concatenation."""
     try:
         with Image.open(path) as img:
-            converted = img.convert("RGB") if img.mode != "RGB" else img.copy()
+            return _prepare_rgb_image(img, compress=compress, quality=quality)
     except (OSError, ValueError) as exc:
         raise InvalidImageError(f"Unable to open '{path.name}' as an image.") from exc
-    if compress:
-        compressed = _compress_image(converted, quality=quality)
-        converted.close()
-        return compressed
-    return converted
 
 
-def image_to_page_asset(path: Path, display_name: str | None = None) -> PageAsset:
-    if not is_supported_image(path):
+def image_to_page_asset(
+    path: Path, display_name: str | None = None, *, kind: str | None = None
+) -> PageAsset:
+    """Wrap an image upload as a page; ``kind`` is the caller's ``classify(path)``, if known."""
+    if (kind or classify(path)) != "image":
         raise InvalidImageError(
             f"Unsupported file type for '{path.name}'. Allowed: {', '.join(sorted(SUPPORTED_IMAGE_EXTENSIONS))}."
         )
     return PageAsset(
-        id=str(uuid4()),
+        id=_next_id(),
         kind="image",
         source_path=path,
         display_name=display_name or path.name,
@@ -114,129 +205,682 @@ def image_to_page_asset(path: Path, display_name: str | None = None) -> PageAsse
 
 
 def pdf_to_page_assets(
-    path: Path, *, temp_tracker: "TempFileTracker" | None = None
+    path: Path,
+    *,
+    temp_tracker: "TempFileTracker" | None = None,
+    preview_dir: Path | None = None,
+    preview_scale: float = PDF_PREVIEW_SCALE,
 ) -> List[PageAsset]:
-    if not is_supported_pdf(path):
+    return list(
+        iter_pdf_page_assets(
+            path,
+            temp_tracker=temp_tracker,
+            preview_dir=preview_dir,
+            preview_scale=preview_scale,
+        )
+    )
+
+
+def _preview_file(directory: Path, stem: str, page_index: int) -> Path:
+    return directory / f"{stem}_p{page_index + 1}{PREVIEW_SUFFIX}"
+
+
+def _new_preview_dir(
+    stem: str, preview_dir: Path | None, temp_tracker: "TempFileTracker" | None
+) -> Path:
+    """Create the directory holding one PDF's previews; page files get fixed names in it."""
+    directory = Path(tempfile.mkdtemp(prefix=f"{stem}_", dir=preview_dir))
+    if temp_tracker is not None:
+        temp_tracker.add(directory)
+    else:
+        register_temp_path(directory)
+    return directory
+
+
+def _render_page_preview(
+    doc: pdfium.PdfDocument,
+    page_index: int,
+    stem: str,
+    directory: Path,
+    scale: float = PDF_PREVIEW_SCALE,
+) -> Path:
+    with _PDFIUM_LOCK:
+        page = doc.get_page(page_index)
+        try:
+            scale = min(scale, PDF_PREVIEW_MAX_WIDTH / max(page.get_width(), 1.0))
+            # RGBX is the layout PIL can wrap without copying, and the JPEG encoder takes it as-is.
+            bitmap = page.render(scale=scale, rev_byteorder=True, prefer_bgrx=True)
+        finally:
+            page.close()
+    pil_image = bitmap.to_pil()
+    target = _preview_file(directory, stem, page_index)
+    try:
+        with open(target, "wb") as handle:
+            pil_image.save(
+                handle,
+                format="JPEG",
+                quality=PREVIEW_JPEG_QUALITY,
+                optimize=False,
+                progressive=False,
+            )
+    finally:
+        pil_image.close()
+        with _PDFIUM_LOCK:
+            bitmap.close()
+    return target
+
+
+def _iter_previews(
+    doc: pdfium.PdfDocument,
+    page_indices: Iterable[int],
+    stem: str,
+    directory: Path,
+    scale: float,
+) -> Iterator[Path]:
+    """Render pages one at a time; each bitmap is released before the next page renders."""
+    for page_index in page_indices:
+        yield _render_page_preview(doc, page_index, stem, directory, scale)
+
+
+def _render_page_range_job(
+    path_str: str, start: int, stop: int, directory: Path, scale: float
+) -> List[str]:
+    """Process-pool entry point; pdfium handles cannot cross processes, so reopen the file.
+
+    Each job renders a contiguous run of pages so the document is parsed once per chunk.
+    """
+    stem = Path(path_str).stem
+    rendered: List[str] = []
+    doc = pdfium.PdfDocument(path_str)
+    try:
+        for preview in _iter_previews(doc, range(start, stop), stem, directory, scale):
+            rendered.append(str(preview))
+    except BaseException:
+        for preview in rendered:
+            Path(preview).unlink(missing_ok=True)
+        raise
+    finally:
+        doc.close()
+    return rendered
+
+
+def _render_mp_context() -> multiprocessing.context.BaseContext:
+    # Forking the threaded server would copy held locks into the workers.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Cheap to preload: importing this module pulls in pdfium and Pillow, not gradio.
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _get_render_pool() -> ProcessPoolExecutor | None:
+    global _RENDER_POOL
+    if PDF_RENDER_WORKERS <= 1:
+        return None
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is None:
+            _RENDER_POOL = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS, mp_context=_render_mp_context()
+            )
+            atexit.register(_RENDER_POOL.shutdown, cancel_futures=True)
+        return _RENDER_POOL
+
+
+def _discard_render_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a broken pool so the next request starts a fresh one."""
+    global _RENDER_POOL
+    with _RENDER_POOL_LOCK:
+        if _RENDER_POOL is pool:
+            _RENDER_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_render_jobs(
+    pool: ProcessPoolExecutor,
+    path: Path,
+    total_pages: int,
+    directory: Path,
+    scale: float,
+) -> List[Future]:
+    chunk = max(1, min(PDF_RENDER_CHUNK_PAGES, -(-total_pages // PDF_RENDER_WORKERS)))
+    return [
+        pool.submit(
+            _render_page_range_job,
+            str(path),
+            start,
+            min(start + chunk, total_pages),
+            directory,
+            scale,
+        )
+        for start in range(0, total_pages, chunk)
+    ]
+
+
+def _submit_render_jobs_with_retry(
+    pool: ProcessPoolExecutor,
+    path: Path,
+    total_pages: int,
+    directory: Path,
+    scale: float,
+) -> tuple[ProcessPoolExecutor, List[Future]]:
+    """Submit to ``pool``, or to a fresh pool if it broke while it sat idle."""
+    try:
+        return pool, _submit_render_jobs(pool, path, total_pages, directory, scale)
+    except BrokenProcessPool:  # this document never reached the dead worker
+        _discard_render_pool(pool)
+        pool = _get_render_pool()
+        return pool, _submit_render_jobs(pool, path, total_pages, directory, scale)
+
+
+def _iter_pooled_previews(
+    pool: ProcessPoolExecutor,
+    path: Path,
+    total_pages: int,
+    directory: Path,
+    scale: float,
+) -> Iterator[Path]:
+    pool, futures = _submit_render_jobs_with_retry(pool, path, total_pages, directory, scale)
+    consumed = 0
+    try:
+        for future in futures:
+            try:
+                preview_paths = future.result()
+            except BrokenProcessPool as exc:
+                _discard_render_pool(pool)
+                raise InvalidImageError(
+                    f"Rendering '{path.name}' crashed the preview worker."
+                ) from exc
+            except Exception as exc:
+                raise InvalidImageError(f"Unable to render '{path.name}' for preview.") from exc
+            consumed += 1
+            for index, preview_path in enumerate(preview_paths):
+                try:
+                    yield Path(preview_path)
+                except GeneratorExit:
+                    for leftover in preview_paths[index + 1 :]:
+                        Path(leftover).unlink(missing_ok=True)
+                    raise
+    finally:
+        # Drop work nobody will consume; previews already written are not registered yet.
+        for future in futures[consumed:]:
+            if not future.cancel():
+                with contextlib.suppress(Exception):
+                    for preview_path in future.result():
+                        Path(preview_path).unlink(missing_ok=True)
+
+
+@functools.lru_cache(maxsize=256)
+def _content_digest(
+    path_str: str, dev: int, ino: int, mtime_ns: int, size: int, scale: float
+) -> str:
+    """Hash a file's bytes; the stat signature in the key lets unchanged files skip this."""
+    digest = hashlib.blake2b(
+        f"{scale!r}|{PDF_PREVIEW_MAX_WIDTH}|{PREVIEW_SUFFIX}|{PREVIEW_JPEG_QUALITY}".encode(
+            "ascii"
+        ),
+        digest_size=16,
+    )
+    with open(path_str, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _preview_cache_dir(path: Path, scale: float = PDF_PREVIEW_SCALE) -> Path | None:
+    """Return the cache directory for ``path``'s content, or None if unreadable."""
+    try:
+        stat = path.stat()
+        digest = _content_digest(
+            str(path), stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size, scale
+        )
+    except OSError:
+        return None
+    return PREVIEW_CACHE_ROOT / digest
+
+
+def _evict_preview_cache(max_bytes: int = PREVIEW_CACHE_MAX_BYTES) -> None:
+    """Drop expired entries, then least recently used ones until the cache fits in ``max_bytes``."""
+    entries: List[tuple[float, int, str]] = []
+    total = 0
+    try:
+        with os.scandir(PREVIEW_CACHE_ROOT) as cache_entries:
+            for entry in cache_entries:
+                if entry.name.startswith(".") or not entry.is_dir(follow_symlinks=False):
+                    continue
+                size = 0
+                with contextlib.suppress(OSError), os.scandir(entry.path) as files:
+                    size = sum(item.stat().st_size for item in files)
+                with contextlib.suppress(OSError):
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                    total += size
+    except OSError:
+        return
+    cutoff = time.time() - PREVIEW_CACHE_TTL.total_seconds()
+    evicted: List[str] = []
+    for mtime, size, entry_path in sorted(entries):
+        if total <= max_bytes and mtime >= cutoff:
+            break
+        evicted.append(entry_path)
+        total -= size
+    if evicted:
+        remove_temp_paths(evicted)
+
+
+def _link_or_copy(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _materialize_cached_previews(
+    cache_dir: Path, stem: str, directory: Path
+) -> List[Path] | None:
+    """Give the session its own links to cached previews, or None on a cache miss."""
+    try:
+        expired = time.time() - cache_dir.stat().st_mtime > PREVIEW_CACHE_TTL.total_seconds()
+    except OSError:
+        return None
+    if expired:  # the registry only prunes at compaction; never serve a stale entry
+        remove_temp_path(cache_dir)
+        return None
+    try:
+        page_count = int((cache_dir / _PREVIEW_CACHE_MANIFEST).read_text("ascii"))
+        names = [_cached_preview_name(page_index) for page_index in range(page_count)]
+        with os.scandir(cache_dir) as entries:
+            present = {entry.name for entry in entries}
+    except (OSError, ValueError):
+        page_count, present, names = 0, set(), []
+    if page_count < 1 or present != {*names, _PREVIEW_CACHE_MANIFEST}:
+        # Entries are published whole, so this one is being removed; let a re-render replace it.
+        remove_temp_path(cache_dir)
+        return None
+    previews: List[Path] = []
+    try:
+        for page_index, name in enumerate(names):
+            target = _preview_file(directory, stem, page_index)
+            _link_or_copy(cache_dir / name, target)
+            previews.append(target)
+    except OSError:  # cache expired underneath us; render instead
+        for preview in previews:
+            preview.unlink(missing_ok=True)
+        return None
+    return previews
+
+
+def _cached_preview_name(page_index: int) -> str:
+    return f"p{page_index + 1:05d}{PREVIEW_SUFFIX}"
+
+
+def _track_cache_dir(cache_dir: Path, temp_tracker: "TempFileTracker" | None) -> None:
+    """(Re)start ``cache_dir``'s expiry; sessions also drop the entries they touched on cleanup."""
+    if temp_tracker is not None:
+        temp_tracker.add(cache_dir, ttl=PREVIEW_CACHE_TTL)
+    else:
+        register_temp_path(cache_dir, ttl=PREVIEW_CACHE_TTL)
+
+
+def _populate_preview_cache(
+    previews: Iterator[Path],
+    cache_dir: Path,
+    temp_tracker: "TempFileTracker" | None = None,
+) -> Iterator[Path]:
+    """Pass previews through while linking them into a staging copy of ``cache_dir``."""
+    staging = cache_dir.with_name(f".{cache_dir.name}-{uuid4().hex}")
+    try:
+        PREVIEW_CACHE_ROOT.mkdir(mode=0o700, exist_ok=True)
+        staging.mkdir(mode=0o700)
+    except OSError:
+        yield from previews
+        return
+    complete = True
+    page_count = 0
+    try:
+        with contextlib.closing(previews):
+            for page_count, preview_path in enumerate(previews, start=1):
+                if complete:
+                    try:
+                        _link_or_copy(preview_path, staging / _cached_preview_name(page_count - 1))
+                    except OSError:
+                        complete = False
+                yield preview_path
+        if complete and page_count:
+            with contextlib.suppress(OSError):  # another session may have published it first
+                (staging / _PREVIEW_CACHE_MANIFEST).write_text(str(page_count), "ascii")
+                staging.rename(cache_dir)
+                _track_cache_dir(cache_dir, temp_tracker)
+                _evict_preview_cache()
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def iter_pdf_page_assets(
+    path: Path,
+    *,
+    temp_tracker: "TempFileTracker" | None = None,
+    preview_dir: Path | None = None,
+    preview_scale: float = PDF_PREVIEW_SCALE,
+    kind: str | None = None,
+) -> Iterator[PageAsset]:
+    """Yield one asset per page as soon as its preview has been rendered.
+
+    Previews are written to a fresh per-document directory inside ``preview_dir``
+    (default: the system temp dir) at ``preview_scale``, capped so no preview
+    exceeds ``PDF_PREVIEW_MAX_WIDTH`` pixels. Callers that already ran
+    ``classify(path)`` pass its result as ``kind`` to skip the lookup.
+    """
+    if (kind or classify(path)) != "pdf":
         raise InvalidImageError("Please upload PDF files with a .pdf extension.")
 
+    directory = _new_preview_dir(path.stem, preview_dir, temp_tracker)
+    cache_dir = _preview_cache_dir(path, preview_scale)
+    cached = (
+        _materialize_cached_previews(cache_dir, path.stem, directory) if cache_dir else None
+    )
+    if cached is not None:
+        _track_cache_dir(cache_dir, temp_tracker)  # refresh expiry on reuse
+        with contextlib.suppress(OSError):  # and its recency for eviction
+            os.utime(cache_dir)
+        yield from _previews_to_assets(path, cached)
+        return
+
     try:
-        doc = pdfium.PdfDocument(str(path))
+        with _PDFIUM_LOCK:
+            doc = pdfium.PdfDocument(str(path))
+            total_pages = len(doc)
     except Exception as exc:  # pragma: no cover
+        shutil.rmtree(directory, ignore_errors=True)
         raise InvalidImageError(f"Unable to render '{path.name}' for preview.") from exc
 
-    assets: List[PageAsset] = []
-    try:
-        total_pages = len(doc)
-        for page_index in range(total_pages):
-            page = doc.get_page(page_index)
-            bitmap = page.render(scale=PDF_PREVIEW_SCALE)
-            pil_image = bitmap.to_pil()
-            with tempfile.NamedTemporaryFile(
-                delete=False,
-                suffix=".png",
-                prefix=f"{path.stem}_p{page_index + 1}_",
-            ) as tmp:
-                pil_image.save(tmp, format="PNG")
-                preview_path = Path(tmp.name)
-            if temp_tracker is not None:
-                temp_tracker.add(preview_path)
-            else:
-                register_temp_path(preview_path)
-            pil_image.close()
-            bitmap.close()
-            page.close()
-            display_name = f"{path.stem} — Page {page_index + 1}"
-            assets.append(
-                PageAsset(
-                    id=str(uuid4()),
-                    kind="pdf",
-                    source_path=path,
-                    display_name=display_name,
-                    preview_path=preview_path,
-                    page_index=page_index,
-                    temp_preview=True,
-                )
+    try:
+        pool = _get_render_pool() if total_pages > 1 else None
+        if pool is not None:
+            with _PDFIUM_LOCK:
+                doc.close()  # workers open their own handles
+            previews = _iter_pooled_previews(
+                pool, path, total_pages, directory, preview_scale
+            )
+        else:
+            previews = _iter_previews(
+                doc, range(total_pages), path.stem, directory, preview_scale
             )
+        if cache_dir is not None:
+            previews = _populate_preview_cache(previews, cache_dir, temp_tracker)
+        with contextlib.closing(previews):
+            yield from _previews_to_assets(path, previews)
     finally:
-        doc.close()
+        with _PDFIUM_LOCK:
+            doc.close()
+
+
+def _previews_to_assets(path: Path, previews: Iterable[Path]) -> Iterator[PageAsset]:
+    # Only the per-document directory is registered; it is removed with everything in it.
+    for page_index, preview_path in enumerate(previews):
+        display_name = f"{path.stem} — Page {page_index + 1}"
+        yield PageAsset(
+            id=_next_id(),
+            kind="pdf",
+            source_path=path,
+            display_name=display_name,
+            preview_path=preview_path,
+            page_index=page_index,
+            temp_preview=True,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class _JpegImage:
+    """JPEG bytes ready to be embedded as a ``/DCTDecode`` image XObject."""
 
-    return assets
+    data: bytes
+    width: int
+    height: int
 
 
-def _image_asset_to_reader(
-    asset: PageAsset, *, compress: bool, quality: int
-) -> PdfReader:
-    buffer = io.BytesIO()
-    image_obj: Image.Image | None = None
+def _passthrough_jpeg(path: Path) -> _JpegImage | None:
+    """Return ``path``'s bytes if it can be embedded verbatim, without decoding pixels."""
+    if path.suffix.lower() not in {".jpg", ".jpeg"}:
+        return None
     try:
-        with Image.open(asset.source_path) as img:
-            rgb_image = img.convert("RGB") if img.mode != "RGB" else img.copy()
-        image_obj = rgb_image
-        if compress:
-            compressed = _compress_image(rgb_image, quality=quality)
-            rgb_image.close()
-            image_obj = compressed
-        image_obj.save(buffer, format="PDF")
-        image_obj.close()
+        with Image.open(path) as img:
+            if img.format != "JPEG" or img.mode not in _JPEG_DIRECT_MODES:
+                return None
+            if img.getexif().get(0x0112, 1) != 1:  # EXIF orientation asks for a rotation
+                return None
+            width, height = img.size
+        return _JpegImage(path.read_bytes(), width, height)
+    except (OSError, ValueError):
+        return None  # let the decoding path report the error
+
+
+def _encode_image_asset(
+    asset: PageAsset, *, compress: bool, quality: int, optimize: bool = False
+) -> _JpegImage:
+    """Encode ``asset`` to JPEG bytes once; the page embeds them as-is.
+
+    Without ``compress`` Pillow's default JPEG settings apply, as its PDF writer used.
+    """
+    options = {"quality": quality, "optimize": optimize} if compress else {}
+    try:
+        with Image.open(asset.source_path) as img, _jpeg_source(img) as source:
+            buffer = io.BytesIO()
+            source.save(buffer, format="JPEG", **options)
+            encoded = _JpegImage(buffer.getvalue(), *source.size)
     except (OSError, ValueError) as exc:
-        if image_obj is not None:
-            with contextlib.suppress(Exception):
-                image_obj.close()
         raise InvalidImageError(
             f"Unable to process '{asset.source_path.name}' for PDF conversion."
         ) from exc
-    buffer.seek(0)
-    reader = PdfReader(buffer)
-    setattr(reader, "_pdf_creator_buffer", buffer)
-    return reader
+    return encoded
+
+
+def _encode_image_page(
+    asset: PageAsset, *, compress: bool, quality: int, optimize: bool
+) -> _JpegImage:
+    if not compress:
+        passthrough = _passthrough_jpeg(asset.source_path)
+        if passthrough is not None:
+            return passthrough
+    return _encode_image_asset(asset, compress=compress, quality=quality, optimize=optimize)
+
+
+def _encode_image_pages(
+    assets: Sequence[PageAsset], *, compress: bool, quality: int, optimize: bool = False
+) -> List[_JpegImage]:
+    """Encode image pages concurrently; Pillow releases the GIL while encoding."""
+    encode = functools.partial(
+        _encode_image_page, compress=compress, quality=quality, optimize=optimize
+    )
+    workers = min(PDF_RENDER_WORKERS, len(assets))
+    if workers <= 1:
+        return [encode(asset) for asset in assets]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(encode, assets))
+
+
+# Source key for the generated document holding every image page.
+_IMAGE_SOURCE = object()
+
+
+def _image_cache_key(asset: PageAsset) -> tuple[Any, ...]:
+    try:
+        return (asset.source_path, asset.source_path.stat().st_mtime_ns)
+    except OSError:
+        return (asset.id,)  # unreadable; encode on its own so the error names this page
 
 
 def assets_to_pdf_bytes(
-    assets: Sequence[PageAsset], *, compress: bool = True, compression_quality: int = 80
+    assets: Sequence[PageAsset],
+    *,
+    compress: bool = True,
+    compression_quality: int = 80,
+    optimize_final: bool = False,
 ) -> bytes:
+    output = io.BytesIO()
+    assets_to_pdf_stream(
+        assets,
+        output,
+        compress=compress,
+        compression_quality=compression_quality,
+        optimize_final=optimize_final,
+    )
+    return output.getvalue()
+
+
+def assets_to_pdf_stream(
+    assets: Sequence[PageAsset],
+    fp: BinaryIO,
+    *,
+    compress: bool = True,
+    compression_quality: int = 80,
+    optimize_final: bool = False,
+) -> None:
+    """Write the merged PDF for ``assets`` straight into the binary file object ``fp``.
+
+    ``optimize_final`` trades encode time for optimized JPEG Huffman tables.
+    """
     if not assets:
         raise InvalidImageError("Please add at least one page before converting to PDF.")
 
-    writer = PdfWriter()
-    pdf_cache: dict[Path, PdfReader] = {}
-    auxiliary_readers: List[PdfReader] = []
+    # Duplicated image pages share one encode and one page in the image document.
+    # Stat each file once: a second stat could see a new mtime and miss the index.
+    image_keys = [_image_cache_key(asset) if asset.kind == "image" else None for asset in assets]
+    unique_images: dict[tuple[Any, ...], PageAsset] = {}
+    for asset, image_key in zip(assets, image_keys):
+        if image_key is not None:
+            unique_images.setdefault(image_key, asset)
+    image_index = {key: index for index, key in enumerate(unique_images)}
+    encoded_images = _encode_image_pages(
+        list(unique_images.values()),
+        compress=compress,
+        quality=compression_quality,
+        optimize=optimize_final,
+    )
 
-    for asset in assets:
+    # pdfium copies pages natively; each source is imported in one call so that
+    # repeated pages share their resources, then the pages are moved into order.
+    imports, slots = _plan_imports(assets, image_keys, image_index)
+    with _PDFIUM_LOCK:
+        output = pdfium.PdfDocument.new()
+        try:
+            offsets: dict[Any, int] = {}
+            for key, indices in imports.items():
+                # Only one source is open at a time: imported pages no longer need it.
+                if key is _IMAGE_SOURCE:
+                    source = _image_pages_document(encoded_images)
+                    encoded_images.clear()
+                else:
+                    source = _open_pdf_source(key)
+                try:
+                    offsets[key] = len(output)
+                    output.import_pages(source, indices)
+                except pdfium.PdfiumError as exc:
+                    name = "images" if key is _IMAGE_SOURCE else f"'{key.name}'"
+                    raise InvalidImageError(f"Unable to copy pages from {name}.") from exc
+                finally:
+                    source.close()
+            order = [offsets[key] + position for key, position in slots]
+            if order != list(range(len(order))):
+                _move_pages(output, order)
+            output.save(fp)
+        finally:
+            output.close()
+
+
+def _plan_imports(
+    assets: Sequence[PageAsset],
+    image_keys: Sequence[tuple[Any, ...] | None],
+    image_index: dict[tuple[Any, ...], int],
+) -> tuple[dict[Any, List[int]], List[tuple[Any, int]]]:
+    """Group page indices by source and record each asset's position within its group."""
+    imports: dict[Any, List[int]] = {}
+    slots: List[tuple[Any, int]] = []
+    for asset, image_key in zip(assets, image_keys):
         if asset.kind == "pdf":
-            reader = pdf_cache.get(asset.source_path)
-            if reader is None:
-                reader = PdfReader(str(asset.source_path))
-                pdf_cache[asset.source_path] = reader
-                auxiliary_readers.append(reader)
-            writer.add_page(reader.pages[asset.page_index])
-        elif asset.kind == "image":
-            reader = _image_asset_to_reader(
-                asset, compress=compress, quality=compression_quality
-            )
-            auxiliary_readers.append(reader)
-            writer.add_page(reader.pages[0])
+            key: Any = asset.source_path
+            page_index = asset.page_index
+        elif image_key is not None:
+            key = _IMAGE_SOURCE
+            page_index = image_index[image_key]
         else:  # pragma: no cover - safeguard for unexpected kinds
             raise InvalidImageError(f"Unsupported page type '{asset.kind}'.")
+        indices = imports.setdefault(key, [])
+        slots.append((key, len(indices)))
+        indices.append(page_index)
+    return imports, slots
 
-    output = io.BytesIO()
-    writer.write(output)
-    writer.close()
-    output.seek(0)
-    return output.read()
+
+def _open_pdf_source(path: Path) -> pdfium.PdfDocument:
+    """Open ``path`` for page import, letting pdfium read straight from the page cache.
+
+    The copy-on-write mapping is never written; it is only writable so ctypes can wrap it.
+    The document keeps the wrapper, and with it the mapping, alive until it is collected.
+    """
+    try:
+        with open(path, "rb") as handle:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_COPY)
+        with _PDFIUM_LOCK:
+            return pdfium.PdfDocument((ctypes.c_char * len(mapping)).from_buffer(mapping))
+    except (pdfium.PdfiumError, OSError, ValueError) as exc:
+        raise InvalidImageError(f"Unable to read '{path.name}' for PDF conversion.") from exc
+
+
+def _image_pages_document(encoded_images: Sequence[_JpegImage]) -> pdfium.PdfDocument:
+    """Put each distinct image on its own page at 72 dpi, matching Pillow's PDF output."""
+    with _PDFIUM_LOCK:
+        doc = pdfium.PdfDocument.new()
+        try:
+            for encoded in encoded_images:
+                page = doc.new_page(encoded.width, encoded.height)
+                image = pdfium.PdfImage.new(doc)
+                image.load_jpeg(io.BytesIO(encoded.data), inline=True)
+                image.set_matrix(pdfium.PdfMatrix().scale(encoded.width, encoded.height))
+                page.insert_obj(image)
+                page.gen_content()
+                page.close()
+        except pdfium.PdfiumError as exc:
+            doc.close()
+            raise InvalidImageError("Unable to place images on PDF pages.") from exc
+        return doc
+
+
+def _move_pages(doc: pdfium.PdfDocument, order: Sequence[int]) -> None:
+    """Rearrange ``doc`` so that page ``i`` is the page currently at ``order[i]``."""
+    c_order = (ctypes.c_int * len(order))(*order)
+    if not pdfium_c.FPDF_MovePages(doc, c_order, len(order), 0):
+        raise InvalidImageError("Unable to arrange pages in the requested order.")
 
 
 def persist_pdf(
-    bytes_payload: bytes,
+    payload: bytes | Callable[[BinaryIO], object],
     filename: str | Path | None = None,
     *,
     temp_tracker: "TempFileTracker" | None = None,
+    directory: str | Path | None = None,
 ) -> Path:
-    """Persist a PDF payload to a temporary file suitable for downloading."""
+    """Persist a PDF payload to a temporary file suitable for downloading.
+
+    ``payload`` is either the PDF bytes or a callable that writes them into
+    the open file, e.g. a partial of :func:`assets_to_pdf_stream`.
+    ``directory`` defaults to the system temp dir; it is created if missing.
+    """
     suffix = ".pdf"
     name = Path(filename or "output.pdf").stem
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, prefix=f"{name}_") as tmp:
-        tmp.write(bytes_payload)
+    if directory is not None:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        delete=False, suffix=suffix, prefix=f"{name}_", dir=directory
+    ) as tmp:
         path = Path(tmp.name)
+        try:
+            if callable(payload):
+                payload(tmp)
+            else:
+                tmp.write(payload)
+        except BaseException:
+            tmp.close()
+            path.unlink(missing_ok=True)
+            raise
     if temp_tracker is not None:
         temp_tracker.add(path)
     else: